@@ -2,7 +2,7 @@ import logging
 from typing import Union
 
 from Buda.BudaIntegrationConfig import BudaMarketConfig, MarketsId, BudaMarketTradeList
-from Buda.BudaPersistence import BudaCsvPersistence
+from Buda.BudaPersistence import BudaCsvPersistence, BudaPersistenceBase
 
 from core.BaseIntegration import BaseCryptoIntegration
 from core.configCore import MarketConfig
@@ -15,8 +15,11 @@ logger = logging.getLogger('FortacrypLogger')
 
 
 class BudaIntegration(BaseCryptoIntegration):
-    def __init__(self, config: BudaMarketConfig):
-        super().__init__(config, BudaCsvPersistence('./'))
+    def __init__(self, config: BudaMarketConfig, persistor: BudaPersistenceBase = None):
+        if persistor is None:
+            persistor = BudaCsvPersistence('./')
+
+        super().__init__(config, persistor)
         self.should_log = True
 
     def _generate_url(self, market_config: MarketConfig) -> str:
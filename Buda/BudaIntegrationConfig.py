@@ -1,11 +1,43 @@
 from dataclasses import dataclass
-from typing import List, Union, Dict
+from functools import cmp_to_key
+from typing import List, Union, Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 from core.configCore import BaseConfig, MarketConfig
 
 
+# positions of the fields in each trade entry of the api response
+_TIMESTAMP_INDEX: int = 0
+_AMOUNT_INDEX: int = 1
+_PRICE_INDEX: int = 2
+_DIRECTION_INDEX: int = 3
+
+# fixed layout in which the trades are accumulated before being resampled
+_TRADE_DTYPE = np.dtype([
+    ('timestamp', 'int64'),
+    ('amount', 'float64'),
+    ('price', 'float64')
+])
+
+# length of each ohlc frame in milliseconds, it must match the '1H' used when merging
+_RESAMPLE_MS: int = 60 * 60 * 1000
+
+# resampled ohlc data, with the timestamps of its first and last trades when they are known
+_OhlcvPart = Tuple[pd.DataFrame, Optional[int], Optional[int]]
+
+# single precision is enough for the ohlc data and halves the memory used by the frames.
+# The persistors read the stored ohlc data with these dtypes too
+OHLCV_DTYPES = {
+    'open': 'float32',
+    'high': 'float32',
+    'low': 'float32',
+    'close': 'float32',
+    'volume': 'float32'
+}
+
+
 @dataclass
 class MarketsId:
     btc = 'btc-clp'
@@ -47,10 +79,14 @@ class BudaMarketConfig(BaseConfig):
 
 
 class BudaMarketTradeEntry:
-    _TIMESAMP_INDEX: int = 0
-    _AMOUNT_INDEX: int = 1
-    _PRICE_INDEX: int = 2
-    _DIRECTION_INDEX: int = 3
+    """
+    Accessor for a single trade entry. BudaMarketTradeList does not use it, the entries are
+    casted in batch by _raw_entries_to_batch
+    """
+    _TIMESAMP_INDEX: int = _TIMESTAMP_INDEX
+    _AMOUNT_INDEX: int = _AMOUNT_INDEX
+    _PRICE_INDEX: int = _PRICE_INDEX
+    _DIRECTION_INDEX: int = _DIRECTION_INDEX
 
     def __init__(self, entry: List[Union[str, int]]):
         self.timestamp: int = int(entry[self._TIMESAMP_INDEX])
@@ -101,16 +137,35 @@ class BudaMarketTradeEntry:
 #   trade_list_ext.append_and_resample(entry_list)
 #   trade_list.merge(trade_list_ext)
 #
+# =========== merging without persisting after each request ==============
+# ====== the merges are queued and bucketed all at once =======
+#
+# while there are more entries:
+#   ...
+#   trade_list.merge(trade_list_ext, defer=True)
+#
+# trade_list.flush()
+#
 class BudaMarketTradeList:
-    def __init__(self, existing_entries: Union[List[BudaMarketTradeEntry], pd.DataFrame] = None,
+    def __init__(self, existing_entries: Union[List[list], pd.DataFrame] = None,
                  filter_timestamp: int = None):
 
-        self.trade_list: Union[List[BudaMarketTradeEntry], pd.DataFrame] = []
+        # each batch of raw entries appended is casted at once into a _TRADE_DTYPE array,
+        # the batches are joined just once when resampling
+        self.trade_list: Union[List[np.ndarray], pd.DataFrame] = []
         self.filter_timestamp: int = filter_timestamp
+        # timestamps of the oldest and newest trades resampled. They are None when unknown, like for
+        # ohlc data read from a file, then the merges order the data by its hours only
+        self.first_timestamp: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        # resampled trade lists waiting to be merged
+        self._pending: List[_OhlcvPart] = []
 
         if existing_entries is not None:
-            if isinstance(existing_entries, (list, pd.DataFrame)):
+            if isinstance(existing_entries, pd.DataFrame):
                 self.trade_list = existing_entries
+            elif isinstance(existing_entries, list):
+                self.append_raw(existing_entries)
             else:
                 raise AssertionError("The existing values must be a list or Dataframe type")
 
@@ -118,26 +173,32 @@ class BudaMarketTradeList:
         if self.is_resampled():
             raise AssertionError("Assertion Error: this instance must not be resampled to be able to append raw data.")
 
-        for entry in new_entries:
-            self.trade_list.append(BudaMarketTradeEntry(entry))
+        if len(new_entries) > 0:
+            self.trade_list.append(_raw_entries_to_batch(new_entries))
 
         return self.trade_list
 
     def resample_ohlcv(self) -> pd.DataFrame:
-        self.trade_list = pd.DataFrame([entry.to_dict() for entry in self.trade_list]).set_index('timestamp')
-        # parses the index from timestamp in seconds to a format understandable for pandas
-        self.trade_list.set_index(self.trade_list.index.values.astype('M8[ms]'), inplace=True)
-        # self.trade_list.set_index(pd.to_datetime(self.trade_list.index, unit='ms').
-        #                           tz_localize('Etc/GMT-4'),
-        #                           inplace=True)
+        if len(self.trade_list) > 0:
+            trades = np.concatenate(self.trade_list)
+        else:
+            trades = np.empty(0, dtype=_TRADE_DTYPE)
+
+        timestamp = trades['timestamp']
+        is_sorted = np.all(timestamp[1:] >= timestamp[:-1])
+        trades = self._filter_by_timestamp(trades, is_sorted)
 
-        self._filter_by_timestamp()
+        # the api responds the most recent trades first, but _trades_to_ohlcv needs each hour to be
+        # a contiguous slice. The sort is stable, as the one pandas resample does, so trades with the
+        # same timestamp keep the order they were appended in
+        if not is_sorted:
+            trades = trades[np.argsort(trades['timestamp'], kind='mergesort')]
 
-        ohlcv = self.trade_list['price'].resample('1H').ohlc().fillna(method='ffill')
-        ohlcv['volume'] = self.trade_list['amount'].resample('1H').sum()
+        if len(trades) > 0:
+            self.first_timestamp = int(trades['timestamp'][0])
+            self.last_timestamp = int(trades['timestamp'][-1])
 
-        ohlcv.index.name = 'date'
-        self.trade_list = ohlcv
+        self.trade_list = _trades_to_ohlcv(trades)
         return self.trade_list
 
     def append_and_resample(self, new_entries: list) -> pd.DataFrame:
@@ -145,7 +206,15 @@ class BudaMarketTradeList:
         self.resample_ohlcv()
         return self.trade_list
 
-    def merge(self, trade_list) -> pd.DataFrame:
+    def merge(self, trade_list, defer: bool = False) -> pd.DataFrame:
+        """
+        Merges an already resampled trade list into this one. Only the hours that overlap the
+        range of the new data are bucketed again, the rest of the stored ohlc is left untouched.
+        :param trade_list: resampled BudaMarketTradeList instance
+        :param defer: if True the data is just queued and will be merged on the next call to flush,
+        useful when merging many responses in a row
+        :return: the merged ohlc data. When deferred, the data without the queued trade lists
+        """
         if not isinstance(trade_list, BudaMarketTradeList):
             raise TypeError('tradelist must be BudaMarketTradeList instance')
         elif not trade_list.is_resampled():
@@ -153,19 +222,171 @@ class BudaMarketTradeList:
         elif not self.is_resampled():
             self.resample_ohlcv()
 
-        merged: pd.DataFrame = self.trade_list.append(trade_list.trade_list)
-        self.trade_list = merged.resample('1H').agg({
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum'
-        }).fillna(method='ffill')
+        self._pending.append((trade_list.trade_list, trade_list.first_timestamp, trade_list.last_timestamp))
+        if defer:
+            return self.trade_list
+
+        return self.flush()
+
+    def flush(self, full: bool = False) -> pd.DataFrame:
+        """
+        Merges the trade lists queued by merge into the stored ohlc data
+        :param full: if True the whole ohlc data is bucketed again instead of only the hours
+        overlapping the queued data
+        :return: the merged ohlc data
+        """
+        if len(self._pending) == 0:
+            return self.trade_list
+
+        # the frames are concatenated in chronological order, so that an hour present in more than
+        # one of them takes the open of the oldest and the close of the newest
+        pending_parts = sorted((part for part in self._pending if len(part[0]) > 0),
+                               key=cmp_to_key(_compare_chronologically))
+        self._pending = []
+        index = self.trade_list.index
+
+        if len(pending_parts) == 0:
+            return self.trade_list
+
+        pending: pd.DataFrame = pd.concat([part[0] for part in pending_parts], copy=False)
+        pending_part: _OhlcvPart = (pending, *_first_and_last_timestamps(pending_parts))
+        stored_part: _OhlcvPart = (self.trade_list, self.first_timestamp, self.last_timestamp)
+
+        # when neither the trades nor the hours tell which data is older the new data goes first,
+        # as the api is recovered backwards
+        pending_first = len(index) > 0 and _compare_chronologically(pending_part, stored_part) <= 0
+        parts = [pending_part, stored_part] if pending_first else [stored_part, pending_part]
+        self.first_timestamp, self.last_timestamp = _first_and_last_timestamps(parts)
+
+        if full or len(index) == 0:
+            self.trade_list = merge_ohlcv(_concat_in_order(self.trade_list, pending, pending_first))
+            return self.trade_list
+
+        # the overlapping window includes the nearest stored hour at each side of the new data,
+        # so that the empty hours between them are generated and forward filled as well
+        start = max(index.searchsorted(pending.index.min()) - 1, 0)
+        end = min(index.searchsorted(pending.index.max(), side='right'), len(index) - 1)
+
+        window = _concat_in_order(self.trade_list.iloc[start:end + 1], pending, pending_first)
+        self.trade_list = pd.concat([self.trade_list.iloc[:start],
+                                     merge_ohlcv(window),
+                                     self.trade_list.iloc[end + 1:]], copy=False)
         return self.trade_list
 
-    def _filter_by_timestamp(self) -> None:
-        if self.filter_timestamp is not None and isinstance(self.trade_list, pd.DataFrame):
-            self.trade_list = self.trade_list[self.trade_list.timestamp > self.filter_timestamp]
+    def _filter_by_timestamp(self, trades: np.ndarray, is_sorted: bool) -> np.ndarray:
+        if self.filter_timestamp is None:
+            return trades
+
+        timestamp = trades['timestamp']
+        if is_sorted:
+            return trades[timestamp.searchsorted(self.filter_timestamp, side='right'):]
+        else:
+            return trades[timestamp > self.filter_timestamp]
 
     def is_resampled(self) -> bool:
         return isinstance(self.trade_list, pd.DataFrame)
+
+
+def _raw_entries_to_batch(entries: List[list]) -> np.ndarray:
+    """
+    Casts the raw entries, as they come from the api, all at once into a _TRADE_DTYPE array.
+    The direction of the trades is not used, so it is discarded
+    """
+    raw = np.asarray(entries, dtype=object)
+    batch = np.empty(len(raw), dtype=_TRADE_DTYPE)
+    batch['timestamp'] = raw[:, _TIMESTAMP_INDEX].astype('int64')
+    batch['amount'] = raw[:, _AMOUNT_INDEX].astype('float64')
+    batch['price'] = raw[:, _PRICE_INDEX].astype('float64')
+    return batch
+
+
+def _trades_to_ohlcv(trades: np.ndarray) -> pd.DataFrame:
+    """
+    Buckets the trades into hourly ohlc frames. Each hour with trades is a contiguous slice of the
+    array, so the frames are reduced with a single pass of reduceat instead of a groupby. The hours
+    without trades are forward filled and have zero volume
+    :param trades: _TRADE_DTYPE array sorted by timestamp
+    :return: DataFrame with open, high, low, close and volume columns indexed by date
+    """
+    columns = ['open', 'high', 'low', 'close', 'volume']
+    if len(trades) == 0:
+        empty = pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='date'))
+        return empty.astype(OHLCV_DTYPES)
+
+    price = trades['price']
+    hours = trades['timestamp'] // _RESAMPLE_MS
+    starts = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1]])
+    ends = np.r_[starts[1:], len(trades)] - 1
+
+    first_hour = hours[0]
+    periods = hours[-1] - first_hour + 1
+    positions = hours[starts] - first_hour
+
+    ohlcv = np.full((periods, len(columns)), np.nan)
+    ohlcv[positions, 0] = price[starts]
+    ohlcv[positions, 1] = np.maximum.reduceat(price, starts)
+    ohlcv[positions, 2] = np.minimum.reduceat(price, starts)
+    ohlcv[positions, 3] = price[ends]
+    ohlcv[:, 4] = 0
+    ohlcv[positions, 4] = np.add.reduceat(trades['amount'], starts)
+
+    index = pd.date_range(pd.Timestamp(first_hour * _RESAMPLE_MS, unit='ms'), periods=periods,
+                          freq='H', name='date')
+    return pd.DataFrame(ohlcv, columns=columns, index=index).ffill().astype(OHLCV_DTYPES)
+
+
+def _compare_chronologically(part: _OhlcvPart, other: _OhlcvPart) -> int:
+    """
+    Compares two non empty ohlc parts by the timestamps of their first trades, or by their hours when
+    the timestamps are unknown or equal
+    :return: negative if part is older than other, positive if it is newer and 0 if it can not tell
+    """
+    frame, first_timestamp, _ = part
+    other_frame, other_first_timestamp, _ = other
+
+    if first_timestamp is not None and other_first_timestamp is not None and \
+            first_timestamp != other_first_timestamp:
+        return -1 if first_timestamp < other_first_timestamp else 1
+
+    hours = (frame.index[0], frame.index[-1])
+    other_hours = (other_frame.index[0], other_frame.index[-1])
+    if hours != other_hours:
+        return -1 if hours < other_hours else 1
+
+    return 0
+
+
+def _first_and_last_timestamps(parts: List[_OhlcvPart]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Timestamps of the first and last trades of the parts once merged, in the order they are given.
+    They are the ones of the parts that give the open of the first hour and the close of the last one
+    """
+    parts = [part for part in parts if len(part[0]) > 0]
+    if len(parts) == 0:
+        return None, None
+
+    first_hour = min(part[0].index[0] for part in parts)
+    last_hour = max(part[0].index[-1] for part in parts)
+    first_timestamp = [part[1] for part in parts if part[0].index[0] == first_hour][0]
+    last_timestamp = [part[2] for part in parts if part[0].index[-1] == last_hour][-1]
+    return first_timestamp, last_timestamp
+
+
+def _concat_in_order(stored: pd.DataFrame, pending: pd.DataFrame, pending_first: bool) -> pd.DataFrame:
+    frames = [pending, stored] if pending_first else [stored, pending]
+    return pd.concat(frames, copy=False)
+
+
+def merge_ohlcv(ohlcv: pd.DataFrame) -> pd.DataFrame:
+    """
+    Buckets again hourly ohlc data that may have more than one row for the same hour. The rows of each
+    hour must be in chronological order. BudaMarketTradeList.flush calls it only with the window of
+    hours overlapping the merged data
+    """
+    return ohlcv.resample('1H').agg({
+        'open': 'first',
+        'high': 'max',
+        'low': 'min',
+        'close': 'last',
+        'volume': 'sum'
+    }).ffill()
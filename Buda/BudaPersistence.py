@@ -1,7 +1,9 @@
 import pandas as pd
 import os
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
 
-from Buda.BudaIntegrationConfig import BudaMarketTradeList
+from Buda.BudaIntegrationConfig import BudaMarketTradeList, OHLCV_DTYPES
 
 
 class BudaPersistenceBase:
@@ -17,9 +19,18 @@ class BudaPersistenceBase:
         self.market = market
 
 
-class BudaCsvPersistence(BudaPersistenceBase):
+class BudaFilePersistence(BudaPersistenceBase, ABC):
+    """
+    Stores the ohlc data of each market in a file inside a folder, merging the new data with the
+    one already stored. The subclasses define the format of the file and its extension
+    """
+    extension: str
+
     # path should point to a folder
     def __init__(self, path: str):
+        if getattr(self, 'extension', None) is None:
+            raise AttributeError('{} must define the extension of the file'.format(type(self).__name__))
+
         self.path = path
 
         if os.path.isfile(path):
@@ -28,6 +39,12 @@ class BudaCsvPersistence(BudaPersistenceBase):
         if not self.path.endswith('/'):
             self.path = self.path + '/'
 
+        # the last ohlc data written and the timestamps of its first and last trades, keyed by the
+        # file path and its stat. Saves reading back the file on the next persist, as long as nobody
+        # else has modified the file in between
+        self._stored_cache: Optional[Tuple[Optional[Tuple[str, int, int]], pd.DataFrame,
+                                           Optional[int], Optional[int]]] = None
+
     def persist(self, market_list: BudaMarketTradeList) -> None:
         """
         Makes sure the trades are merged with the stored ohcl data before calling the persistor
@@ -35,16 +52,72 @@ class BudaCsvPersistence(BudaPersistenceBase):
         if self.market is None:
             raise AttributeError('market attribute of the instance should not be None')
 
-        path = os.path.join(self.path, 'Buda_' + self.market + '.csv')
+        path = os.path.join(self.path, 'Buda_{}.{}'.format(self.market, self.extension))
         if not market_list.is_resampled():
             market_list.resample_ohlcv()
 
+        # the trade lists queued with a deferred merge are persisted too
+        market_list.flush()
+
         if os.path.isfile(path):
-            stored = pd.read_csv(path, sep=',', encoding='utf-8', parse_dates=True, index_col='date')
+            # the new trades are merged into the stored data and not the other way around, so only
+            # the stored hours overlapping the new trades are bucketed again
+            stored_market_list = self._read_stored(path)
+            stored_market_list.merge(market_list)
+            market_list = stored_market_list
+
+        self._write(market_list.trade_list, path)
+        self._stored_cache = (_cache_key(path), market_list.trade_list,
+                              market_list.first_timestamp, market_list.last_timestamp)
+
+    def _read_stored(self, path: str) -> BudaMarketTradeList:
+        stored_market_list = BudaMarketTradeList()
+        if self._stored_cache is not None and self._stored_cache[0] == _cache_key(path):
+            _, stored_market_list.trade_list, stored_market_list.first_timestamp, \
+                stored_market_list.last_timestamp = self._stored_cache
+        else:
+            stored_market_list.trade_list = self._read(path)
+
+        return stored_market_list
+
+    @abstractmethod
+    def _read(self, path: str) -> pd.DataFrame:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _write(self, ohlcv: pd.DataFrame, path: str) -> None:
+        raise NotImplementedError()
+
+
+class BudaCsvPersistence(BudaFilePersistence):
+    extension = 'csv'
+
+    def _read(self, path: str) -> pd.DataFrame:
+        # the dtypes are given up front so pandas does not have to infer them from every cell
+        return pd.read_csv(path, sep=',', encoding='utf-8', usecols=['date', *OHLCV_DTYPES],
+                           dtype=OHLCV_DTYPES, parse_dates=['date'], index_col='date')
+
+    def _write(self, ohlcv: pd.DataFrame, path: str) -> None:
+        ohlcv.to_csv(path, encoding='utf-8')
+
+
+class BudaParquetPersistence(BudaFilePersistence):
+    """
+    Stores the ohlc data in a parquet file, which keeps the dtypes and the date index, so it is
+    loaded without parsing any text. Requires pyarrow
+    """
+    extension = 'parquet'
+
+    def _read(self, path: str) -> pd.DataFrame:
+        return pd.read_parquet(path, engine='pyarrow', columns=list(OHLCV_DTYPES), memory_map=True)
+
+    def _write(self, ohlcv: pd.DataFrame, path: str) -> None:
+        ohlcv.to_parquet(path, engine='pyarrow', compression='zstd')
 
-            stored_market_list = BudaMarketTradeList()
-            stored_market_list.trade_list = stored
 
-            market_list.merge(stored_market_list)
+def _cache_key(path: str) -> Optional[Tuple[str, int, int]]:
+    if not os.path.isfile(path):
+        return None
 
-        market_list.trade_list.to_csv(path, encoding='utf-8')
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
@@ -1,10 +1,14 @@
 from unittest import TestCase, mock
 import numpy as np
 import json
+import os
+import tempfile
 import urllib.parse as urlparse
 
 from Buda.BudaIntegration import BudaIntegration
+from Buda import BudaIntegrationConfig
 from Buda.BudaIntegrationConfig import BudaMarketTradeList, BudaMarketConfig
+from Buda.BudaPersistence import BudaCsvPersistence, BudaParquetPersistence, BudaFilePersistence
 from core.configCore import MarketConfig
 
 
@@ -42,6 +46,33 @@ class BudaMarketTradeListTest(TestCase):
 
         self.assertTrue(np.array_equal(vol_series, vol_pd))
 
+    def test_resample_string_entries(self):
+        # the api responds the entries as strings
+        str_list = [[str(value) for value in entry] for entry in self.li]
+        trade_list = BudaMarketTradeList()
+        trade_list.append_and_resample(str_list)
+
+        expected = BudaMarketTradeList()
+        expected.append_and_resample(self.li)
+
+        self.assertTrue(expected.trade_list.equals(trade_list.trade_list))
+
+    def test_filter_by_timestamp(self):
+        # only the entries after 19/03/2019 09:51:30 should be resampled
+        filter_timestamp = self.li[7][0]
+        expected = BudaMarketTradeList()
+        expected.append_and_resample(self.li[8:])
+
+        trade_list = BudaMarketTradeList(filter_timestamp=filter_timestamp)
+        trade_list.append_and_resample(self.li)
+        self.assertTrue(expected.trade_list.equals(trade_list.trade_list))
+
+        # the api responds the most recent entries first
+        trade_list = BudaMarketTradeList(filter_timestamp=filter_timestamp)
+        trade_list.append_and_resample(self.li[::-1])
+        self.assertTrue(np.array_equal(expected.trade_list['volume'].to_numpy(),
+                                       trade_list.trade_list['volume'].to_numpy()))
+
     def test_merge(self):
         l1 = self.li[:7]  # split the list right at 9 am, so that timestamp is present in the 2 df when merged
         l2 = self.li[7:]
@@ -59,6 +90,21 @@ class BudaMarketTradeListTest(TestCase):
 
         self.assertTrue(tl1.trade_list.equals(tl_copy1.trade_list))
 
+    def test_deferred_merge(self):
+        tl1 = BudaMarketTradeList()
+        tl1.append_and_resample(self.li)
+
+        tl_copy = BudaMarketTradeList()
+        tl_copy.append_and_resample(self.li[:5])
+        for entries in (self.li[5:7], self.li[7:12], self.li[12:]):
+            tl_ext = BudaMarketTradeList()
+            tl_ext.append_and_resample(entries)
+            tl_copy.merge(tl_ext, defer=True)
+
+        self.assertEqual(len(tl_copy.trade_list), 3)
+        tl_copy.flush()
+        self.assertTrue(tl1.trade_list.equals(tl_copy.trade_list))
+
     def test_merge_fails_no_trade_list(self):
         l1 = self.li[:7]
         l2 = self.li[7:]
@@ -95,6 +141,114 @@ class BudaMarketTradeListTest(TestCase):
         self.assertTrue(tl1.trade_list.equals(tl_copy1.trade_list))
 
 
+class BudaCsvPersistenceTest(TestCase):
+    persistor_class = BudaCsvPersistence
+    read_function = 'read_csv'
+
+    def setUp(self):
+        self.li = get_entries_list()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.persistor = self.persistor_class(self.tmp_dir.name)
+        self.persistor.set_market('btc')
+        self.file_path = '{}/Buda_btc.{}'.format(self.tmp_dir.name, self.persistor_class.extension)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_persist_does_not_read_back_own_file(self):
+        self.persistor.persist(BudaMarketTradeList(self.li[7:]))
+
+        with mock.patch('Buda.BudaPersistence.pd.' + self.read_function) as read_function:
+            self.persistor.persist(BudaMarketTradeList(self.li[:7]))
+            read_function.assert_not_called()
+
+        # a fresh persistor has no cache, so it reads the same data from disk
+        fresh = self.persistor_class(self.tmp_dir.name)
+        fresh.set_market('btc')
+        stored = fresh._read_stored(self.file_path).trade_list
+
+        expected = BudaMarketTradeList()
+        expected.append_and_resample(self.li)
+        self.assertTrue(expected.trade_list.equals(stored))
+
+    def test_persist_newer_entries(self):
+        # the 9 am hour is present in both persists, its open and close must still be chronological
+        self.persistor.persist(BudaMarketTradeList(self.li[:7]))
+        self.persistor.persist(BudaMarketTradeList(self.li[7:]))
+
+        expected = BudaMarketTradeList()
+        expected.append_and_resample(self.li)
+        self.assertTrue(expected.trade_list.equals(self.persistor._read(self.file_path)))
+
+    def test_persist_older_page_in_same_hour(self):
+        # two consecutive pages of the api, recovered backwards, with all their trades in the 3 am hour
+        newer_page = [[1552967341233, 1, 0.3, 'buy'], [1552967141233, 1, 0.2, 'buy']]
+        older_page = [[1552966701233, 1, 0.1, 'buy'], [1552964400010, 1, 0.05, 'buy']]
+        expected = BudaMarketTradeList()
+        expected.append_and_resample(newer_page + older_page)
+
+        self.persistor.persist(BudaMarketTradeList(newer_page))
+        self.persistor.persist(BudaMarketTradeList(older_page))
+        self.assertTrue(expected.trade_list.equals(self.persistor._read(self.file_path)))
+
+        # read back from the file the timestamps of the trades are unknown, the new page goes first
+        os.remove(self.file_path)
+        self.persistor.persist(BudaMarketTradeList(newer_page))
+        fresh = self.persistor_class(self.tmp_dir.name)
+        fresh.set_market('btc')
+        fresh.persist(BudaMarketTradeList(older_page))
+        self.assertTrue(expected.trade_list.equals(fresh._read(self.file_path)))
+
+    def test_persist_deferred_merges(self):
+        trade_list = BudaMarketTradeList()
+        trade_list.append_and_resample(self.li[:7])
+        trade_list_ext = BudaMarketTradeList()
+        trade_list_ext.append_and_resample(self.li[7:])
+        trade_list.merge(trade_list_ext, defer=True)
+        self.persistor.persist(trade_list)
+
+        expected = BudaMarketTradeList()
+        expected.append_and_resample(self.li)
+        self.assertTrue(expected.trade_list.equals(self.persistor._read(self.file_path)))
+
+    def test_persist_rebuckets_only_new_hours(self):
+        # a trade every hour for a month, then a single new trade after the last one
+        hour_ms = 60 * 60 * 1000
+        history = [[self.li[0][0] + i * hour_ms, 1, 0.1, 'buy'] for i in range(24 * 30)]
+        new_entry = [history[-1][0] + 1000, 2, 0.2, 'buy']
+        self.persistor.persist(BudaMarketTradeList(history))
+
+        with mock.patch.object(BudaIntegrationConfig, 'merge_ohlcv',
+                               wraps=BudaIntegrationConfig.merge_ohlcv) as merge_ohlcv:
+            self.persistor.persist(BudaMarketTradeList([new_entry]))
+            merge_ohlcv.assert_called_once()
+            self.assertLessEqual(len(merge_ohlcv.call_args[0][0]), 3)
+
+        expected = BudaMarketTradeList()
+        expected.append_and_resample(history + [new_entry])
+        self.assertTrue(expected.trade_list.equals(self.persistor._read(self.file_path)))
+
+
+class BudaParquetPersistenceTest(BudaCsvPersistenceTest):
+    persistor_class = BudaParquetPersistence
+    read_function = 'read_parquet'
+
+
+class BudaFilePersistenceTest(TestCase):
+    def test_base_can_not_be_instanciated(self):
+        self.assertRaises(TypeError, BudaFilePersistence, './')
+
+    def test_fails_without_extension(self):
+        class NoExtensionPersistence(BudaFilePersistence):
+            def _read(self, path):
+                pass
+
+            def _write(self, ohlcv, path):
+                pass
+
+        self.assertRaises(AttributeError, NoExtensionPersistence, './')
+
+
 class MockResponse:
     def __init__(self, json_data: dict, status_code):
         self.text = json.dumps(json_data)
@@ -5,6 +5,7 @@ import time
 from enum import Enum
 from typing import Union, Optional
 
+import orjson
 import requests
 from core.configCore import MarketConfig
 from core.Constants import *
@@ -283,7 +284,8 @@ class CoreIntegration(ABC):
     def __init__(self, configuration=None, persistor=None):
         self.config = configuration
         self.persistor = persistor
-        self.requests = requests
+        # reuses the same connection for the chained requests
+        self.requests = requests.Session()
 
     def recover(self, market: IntegrationMarkets):
         if not hasattr(self.config, market.value):
@@ -314,7 +316,7 @@ class CoreIntegration(ABC):
         if r.status_code != 200:
             raise ConnectionError(f'Response code: {r.status_code} from server')
 
-        return self.parse_response_to_list(json.loads(r.text), market_config)
+        return self.parse_response_to_list(orjson.loads(r.content), market_config)
 
     @abstractmethod
     def generate_url(self, market_config) -> str:
@@ -329,7 +331,11 @@ class CoreIntegration(ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def parse_response_to_list(self, response, market_config=None) -> list:
+    def parse_response_to_list(self, response, market_config=None) -> Union[list, dict]:
+        """
+        Maps the response into the entries that are passed to the persistor, either as a list of rows
+        or as a dict of columns
+        """
         raise NotImplementedError()
 
     @abstractmethod
@@ -1,10 +1,11 @@
 import datetime
-import json
 import logging
 import threading
 from dataclasses import dataclass
-from typing import Optional, Any, Dict, Union, Tuple
+from typing import Optional, Any, Dict, Tuple, List
 
+import numpy as np
+import orjson
 import requests
 from websocket import create_connection
 
@@ -14,7 +15,7 @@ from core.Constants import *
 from cryptoCompare.CryptoCompareIntegrationConfig import CryptoCompareConfig
 from krakenWebSocket.KrakenAlerts import KrakenTelegramAlerts, KrakenBaseAlerts
 from krakenWebSocket.KrakenPersistors import KrakenPersistor
-from krakenWebSocket.KrakenTicketHandler import BaseKrakenTicketHandler
+from krakenWebSocket.KrakenTicketHandler import BaseKrakenTicketHandler, KrakenTicket
 
 _markets_available = ('btc', 'eth', 'bch', 'ltc')
 logger = logging.getLogger('FortacrypLogger')
@@ -79,7 +80,9 @@ class KrakenSocketHandler(threading.Thread):
         self.logger = logger
         self.pair: Optional[list] = None
         self.alertHandler = KrakenTelegramAlerts()
-        self._kill_thread: bool = False
+        # mutable flag, so the receive loop can hold a reference to it instead of looking it up
+        # in the instance on every message
+        self._kill_switch: List[bool] = [False]
         self.on_new_price_callback: Optional[callable] = None
 
     def run(self) -> None:
@@ -100,12 +103,12 @@ class KrakenSocketHandler(threading.Thread):
         self.start()
 
     def connect_on_this_thread(self, pair: list, on_new_price_callback: callable) -> None:
-        self._kill_thread = False
+        self._kill_switch[0] = False
         self._init_args(pair, on_new_price_callback)
         self.run()
 
     def kill_on_next_receiv(self) -> None:
-        self._kill_thread = True
+        self._kill_switch[0] = True
 
     def _init_args(self, pair: list, on_new_price_callback: callable) -> None:
         self.pair = pair
@@ -129,37 +132,44 @@ class KrakenSocketHandler(threading.Thread):
                 else:
                     break
 
-        if not self._kill_thread:
+        if not self._kill_switch[0]:
             self.alertHandler.send_error_alert('Max Attempts to connect to socket exceeded')
 
-    def _manage_connection(self) -> Optional[Tuple[Exception, str]]:
-        while True:
-            response = None
-            try:
-                if self._kill_thread:
-                    return None
+    def _manage_connection(self) -> Tuple[Optional[Exception], Optional[str]]:
+        # bound once, since this runs for every message of the socket
+        recv = self.ws.recv
+        loads = orjson.loads
+        callback = self.on_new_price_callback
+        kill_switch = self._kill_switch
 
-                result = self.ws.recv()
-                response = result
-                result = json.loads(result)
+        response = None
+        try:
+            while not kill_switch[0]:
+                # cleared so that a failing recv() does not report the previous frame in the alert
+                response = None
+                response = recv()
+                result = loads(response)
+
+                # events like the heartbeat come as dicts, the trades as lists
+                if type(result) is list:
+                    callback(result)
+        except Exception as e:
+            self.ws.close()
+            self.ws = None
+            return e, response
 
-                if isinstance(result, list):
-                    self.on_new_price_callback(result)
-            except Exception as e:
-                self.ws.close()
-                self.ws = None
-                return e, response
+        return None, None
 
     def _create_connection(self) -> bool:
         self.logger.info('Connecting to Kraken websocket')
         try:
             self.ws = create_connection(self.socket_url)
             self.logger.info('Subscribing to pairs {}'.format(self.pair))
-            self.ws.send(json.dumps({
+            self.ws.send(orjson.dumps({
                 "event": "subscribe",
                 "pair": self.pair,
                 "subscription": {"name": "trade"}
-            }))
+            }).decode())
             return True
 
         except Exception as error:
@@ -171,27 +181,28 @@ class KrakenSocketHandler(threading.Thread):
             return False
 
 
-def _ticket_list_to_dict(socket_trade: list) -> Dict[str, Union[float, str]]:
-    mapper = {
-        'XBT/USD': 'btc',
-        'ETH/USD': 'eth',
-        'BCH/USD': 'bch',
-        'LTC/USD': 'ltc'
-    }
+_MARKET_MAPPER = {
+    'XBT/USD': 'btc',
+    'ETH/USD': 'eth',
+    'BCH/USD': 'bch',
+    'LTC/USD': 'ltc'
+}
 
-    trade_list = socket_trade[Constants.TRADE_LIST]
-    trade = {
-        'market': mapper[socket_trade[Constants.MARKET_INDEX]],
-        'timestamp': float(trade_list[-1][Constants.TIME_INDEX]),
-        'price': float(trade_list[-1][Constants.PRICE_INDEX])
-    }
+# bound once since they are read on every ticket
+_TRADE_LIST = Constants.TRADE_LIST
+_MARKET_INDEX = Constants.MARKET_INDEX
+_TIME_INDEX = Constants.TIME_INDEX
+_PRICE_INDEX = Constants.PRICE_INDEX
+_VOLUME_INDEX = Constants.VOLUME_INDEX
 
-    volume = 0
-    for entry in trade_list:
-        volume += float(entry[Constants.VOLUME_INDEX])
 
-    trade['volume'] = volume
-    return trade
+def _ticket_list_to_ticket(socket_trade: list) -> KrakenTicket:
+    trade_list = socket_trade[_TRADE_LIST]
+    last_trade = trade_list[-1]
+    return KrakenTicket(_MARKET_MAPPER[socket_trade[_MARKET_INDEX]],
+                        float(last_trade[_TIME_INDEX]),
+                        float(last_trade[_PRICE_INDEX]),
+                        sum(float(entry[_VOLUME_INDEX]) for entry in trade_list))
 
 
 _kraken_mapper = markets = {
@@ -224,7 +235,9 @@ _kraken_mapper = markets = {
 
 class KrakenIntegration:
     def __init__(self, config, market_list=('btc',)):
-        self.requests = requests  # just to make it easier to test by making easier to inject a mock
+        # just to make it easier to test by making easier to inject a mock. The session keeps the
+        # connection alive between the requests for each market
+        self.requests = requests.Session()
         # stores the timestamp on which a new hourly candle will be generated
         self.curr_close_timestamp: datetime.datetime = datetime.datetime.now() + datetime.timedelta(hours=1)
         self.curr_close_timestamp: datetime.datetime = self.curr_close_timestamp.replace(minute=0, second=0,
@@ -261,7 +274,7 @@ class KrakenIntegration:
         self.websocket_handler.join()
 
     def _on_ticket(self, ticket: list) -> None:
-        last_trade = _ticket_list_to_dict(ticket)
+        last_trade = _ticket_list_to_ticket(ticket)
 
         self.ticket_handler.on_new_ticket(last_trade)
         self.logger.info(last_trade)
@@ -275,7 +288,7 @@ class KrakenIntegration:
                 raise ConnectionError('could not recover open price from kraken rest api for pair {}'
                                       .format(market['ohlc_pair']))
 
-            json_response = json.loads(r.text)
+            json_response = orjson.loads(r.content)
             last_entry = json_response['result'][market['response_key']][-1]
             market['open'] = last_entry[Constants.REST_OPEN_INDEX]
             market['high'] = last_entry[Constants.REST_HIGH_INDEX]
@@ -311,33 +324,32 @@ class KrakenHistoricalDataIntegration(ForwardRecoverIntegration):
             now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0).timestamp()
             return self.persistor.get_most_recent_timestamp() >= now
 
-    def get_most_recent_entry_ts(self, data_list: list) -> int:
-        return data_list[-1]['timestamp']
-
-    def get_older_entry_ts(self, data_list) -> int:
-        return data_list[0]['timestamp']
-
-    def parse_response_to_list(self, response, market_config: Optional[KrakenMarketConfig] = None) -> list:
-        response_list = response['result'][market_config.response_key]
-
-        def mapper(entry):
-            return {
-                'open': entry[Constants.REST_OPEN_INDEX],
-                'high': entry[Constants.REST_HIGH_INDEX],
-                'low': entry[Constants.REST_LOW_INDEX],
-                'close': entry[Constants.REST_CLOSE_INDEX],
-                'volume': entry[Constants.REST_VOLUME_INDEX],
-                'timestamp': entry[Constants.REST_TIMESTAMP_INDEX]
-            }
+    def get_most_recent_entry_ts(self, data_list: Dict[str, np.ndarray]) -> int:
+        return int(data_list['timestamp'][-1])
+
+    def get_older_entry_ts(self, data_list: Dict[str, np.ndarray]) -> int:
+        return int(data_list['timestamp'][0])
+
+    def parse_response_to_list(self, response,
+                               market_config: Optional[KrakenMarketConfig] = None) -> Dict[str, np.ndarray]:
+        """
+        Maps the ohlc response into columns, each one an array with the values of every entry
+        """
+        response_list = np.asarray(response['result'][market_config.response_key], dtype=object)
+        parsed = {
+            'open': response_list[:, Constants.REST_OPEN_INDEX].astype(float),
+            'high': response_list[:, Constants.REST_HIGH_INDEX].astype(float),
+            'low': response_list[:, Constants.REST_LOW_INDEX].astype(float),
+            'close': response_list[:, Constants.REST_CLOSE_INDEX].astype(float),
+            'volume': response_list[:, Constants.REST_VOLUME_INDEX].astype(float),
+            'timestamp': response_list[:, Constants.REST_TIMESTAMP_INDEX].astype('int64')
+        }
 
-        parsed = list(map(mapper, response_list))
         # the last key from response contains the timestamp from the last commited frame,
         # so if the last entry of the list is greater than that, it means it is
         # an uncommited frame and should be discarted
-        last = response['result']['last']
-        last_parsed = parsed[-1]['timestamp']
-        if last < last_parsed:
-            parsed.pop()
+        if response['result']['last'] < parsed['timestamp'][-1]:
+            parsed = {key: column[:-1] for key, column in parsed.items()}
 
         return parsed
 
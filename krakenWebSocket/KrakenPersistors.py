@@ -1,5 +1,5 @@
 import os
-from typing import Optional, Dict, List, Union
+from typing import Optional, Dict
 
 import pandas as pd
 import numpy as np
@@ -14,7 +14,7 @@ class KrakenPersistor:
         self.timestamp_key: str = 'timestamp'
         self.default_first_timestamp = 1356998400
 
-    def persist(self, new_data: List[Dict[str, Union[float, int]]]):
+    def persist(self, new_data: Dict[str, np.ndarray]):
         self._read_buffer()
         df = pd.DataFrame(new_data, columns=self._get_columns_names())
 
@@ -1,13 +1,23 @@
 import datetime
 import logging
 import os
-from typing import Optional, Dict, Union
+from typing import Optional, Dict, Union, NamedTuple
 
 import pandas as pd
 
 logger = logging.getLogger('FortacrypLogger')
 
 
+class KrakenTicket(NamedTuple):
+    """
+    Last trade of a websocket ticket, along with the volume of all the trades in the ticket
+    """
+    market: str
+    timestamp: float
+    price: float
+    volume: float
+
+
 class KrakenHistoricalDataBase:
     def __init__(self, market: str):
         available_markets = ('btc', 'ltc', 'bch', 'eth')
@@ -64,11 +74,11 @@ class KrakenHistoricalDataBase:
         self.data = dataframe
         return dataframe
 
-    def append_ticket(self, ticket: Dict[str, float]):
+    def append_ticket(self, ticket: KrakenTicket):
         if not isinstance(self.data, pd.DataFrame):
             raise TypeError('Attribute Data of KrakenHistoricalDataBase is not DataFrame type.')
 
-        if self._should_apped_new(ticket['timestamp']):
+        if self._should_apped_new(ticket.timestamp):
             self._insert_new_ohlc(ticket)
         else:
             if not self.has_open:
@@ -85,11 +95,11 @@ class KrakenHistoricalDataBase:
         last_stored = float(self.data['time'].values[-1])
         return timestamp - last_stored > 3600
 
-    def _insert_new_ohlc(self, ticket: Dict[str, float]) -> None:
+    def _insert_new_ohlc(self, ticket: KrakenTicket) -> None:
         new_candle = {
             'open': self.open,
             'high': self.high,
-            'close': ticket['price'],
+            'close': ticket.price,
             'low': self.low,
             'volume': self.volume
         }
@@ -98,18 +108,18 @@ class KrakenHistoricalDataBase:
         self.has_open = False
         self.persist()
 
-    def _reinit_state_on_opening_price(self, ticket: Dict[str, float]) -> None:
-        self.logger.info('New Opening price: {}'.format(ticket['price']))
+    def _reinit_state_on_opening_price(self, ticket: KrakenTicket) -> None:
+        self.logger.info('New Opening price: {}'.format(ticket.price))
         self.has_open = True
-        self.open = ticket['price']
+        self.open = ticket.price
         self.high = self.open
         self.low = self.open
         self.volume = 0
 
-    def _update_on_new_price(self, ticket: Dict[str, float]) -> None:
-        self.high = ticket['price'] if ticket['price'] > self.high else self.high
-        self.low = ticket['price'] if ticket['price'] < self.low else self.low
-        self.volume += ticket['volume']
+    def _update_on_new_price(self, ticket: KrakenTicket) -> None:
+        self.high = ticket.price if ticket.price > self.high else self.high
+        self.low = ticket.price if ticket.price < self.low else self.low
+        self.volume += ticket.volume
 
     def _get_save_path(self, market):
         return os.path.join(self.base_path, self.csv_name.format(market))
@@ -139,9 +149,9 @@ class BaseKrakenTicketHandler:
                              ' of delay with now(). Last stored timestamp: {}, now: {}'.
                              format(market, last_timestamp, now))
 
-    def on_new_ticket(self, ticket: Dict[str, Union[str, float]]) -> None:
-        self._verify_market(ticket['market'])
-        self.market_data[ticket['market']].append_ticket(ticket)
+    def on_new_ticket(self, ticket: KrakenTicket) -> None:
+        self._verify_market(ticket.market)
+        self.market_data[ticket.market].append_ticket(ticket)
 
     def _verify_market(self, market) -> None:
         if market not in self.available_markets:
@@ -1,6 +1,7 @@
 import datetime
 import json
 import logging
+import tempfile
 from unittest import TestCase, mock
 
 import numpy as np
@@ -9,8 +10,9 @@ import pandas as pd
 from core.config import root_config_from_dict
 from core.configCore import _config
 from krakenWebSocket.KrakenIntegration import KrakenIntegration, KrakenSocketHandler, \
-    _ticket_list_to_dict
-from krakenWebSocket.KrakenTicketHandler import KrakenHistoricalDataBase
+    KrakenHistoricalDataIntegration, _ticket_list_to_ticket
+from krakenWebSocket.KrakenPersistors import KrakenPersistor
+from krakenWebSocket.KrakenTicketHandler import KrakenHistoricalDataBase, KrakenTicket, BaseKrakenTicketHandler
 
 df = pd.DataFrame(data=np.arange(12).reshape(2, 6),
                   columns=['time', 'open', 'high', 'low', 'close', 'volumefrom'])
@@ -123,6 +125,10 @@ class DummyResponse:
         self.status_code = 200
         self.text = '[]'
 
+    @property
+    def content(self) -> bytes:
+        return self.text.encode()
+
 
 class DummyRequests:
     def __init__(self):
@@ -180,21 +186,6 @@ class KrakenIntegrationTest(TestCase):
         root_config.crypto_compare.btc.recovered_all = True
         self.kraken = KrakenIntegration(root_config.crypto_compare)
 
-    def test_parse_ticket(self):
-        dummy = DummyWebScocket()
-        dummy.initial_timestamp = 122
-        dummy = json.loads(dummy.recv())
-
-        expected = {
-            'market': 'XBT/USD',
-            'timestamp': 123.1,
-            'price': 6060.0,
-            'volume': 0.18305568
-        }
-
-        parsed = _ticket_list_to_dict(dummy)
-        self.assertEqual(parsed, expected)
-
     def test_fail_if_no_init(self):
         root_config = root_config_from_dict(_config)
         with self.assertRaises(ValueError):
@@ -230,6 +221,103 @@ class KrakenIntegrationTest(TestCase):
             self.assertEqual(result, expected)
 
 
+class KrakenTicketTest(TestCase):
+    """
+    Covers the ticket flow without the KrakenIntegration constructor, which needs a full configuration
+    """
+    def test_parse_ticket(self):
+        dummy = DummyWebScocket()
+        dummy.initial_timestamp = 122
+        dummy = json.loads(dummy.recv())
+
+        expected = KrakenTicket(market='btc', timestamp=123.1, price=6060.0, volume=0.18305568)
+
+        parsed = _ticket_list_to_ticket(dummy)
+        self.assertEqual(parsed, expected)
+
+    def test_append_ticket(self):
+        data = KrakenHistoricalDataBase('btc')
+        data.data = df.copy(deep=True)
+        last_stored = float(data.data['time'].values[-1])
+
+        handler = BaseKrakenTicketHandler()
+        handler.market_data['btc'] = data
+        handler.on_new_ticket(KrakenTicket('btc', last_stored + 10, 100.0, 1.5))
+
+        self.assertTrue(data.has_open)
+        self.assertEqual((data.open, data.high, data.low, data.volume), (100.0, 100.0, 100.0, 0))
+
+        data.append_ticket(KrakenTicket('btc', last_stored + 20, 110.0, 2.0))
+        data.append_ticket(KrakenTicket('btc', last_stored + 30, 90.0, 0.5))
+        self.assertEqual((data.open, data.high, data.low, data.volume), (100.0, 110.0, 90.0, 2.5))
+
+    def test_get_open_price(self):
+        kraken = KrakenIntegration.__new__(KrakenIntegration)
+        kraken.requests = DummyRequests()
+        kraken.ticket_handler = mock.Mock()
+        kraken.market_list = {
+            'btc': {'ohlc_pair': 'XBTUSD', 'response_key': 'XXBTZUSD', 'key': 'btc'}
+        }
+
+        market = kraken._get_open_price()['btc']
+        self.assertEqual((market['open'], market['high'], market['low'], market['volume']),
+                         ('9181.0', '9181.0', '9106.1', '127.50098346'))
+        kraken.ticket_handler.init_open_data.assert_called_once_with('btc', '9181.0', '9181.0',
+                                                                     '9106.1', '127.50098346')
+
+
+class KrakenHistoricalDataIntegrationTest(TestCase):
+    def setUp(self) -> None:
+        self.kraken = KrakenHistoricalDataIntegration(persistor=mock.Mock())
+        self.kraken.logger = logger
+        self.response = {
+            'result': {
+                'XXBTZUSD': [
+                    [1561485600, "11336.89", "11375.54", "11218.93", "11329.88", "11350.1", "4543.82", 481],
+                    [1561489200, "11329.88", "11395.47", "11302.7", "11381.36", "11352.4", "1907.43", 352],
+                    [1561492800, "11381.36", "11394.01", "11368.19", "11385.96", "11380.8", "308.71", 97]
+                ],
+                'last': 1561489200
+            }
+        }
+
+    def test_parse_response_discards_uncommited_frame(self):
+        parsed = self.kraken.parse_response_to_list(self.response, self.kraken.config.btc)
+
+        self.assertTrue(np.array_equal(parsed['timestamp'], [1561485600, 1561489200]))
+        self.assertTrue(np.array_equal(parsed['open'], [11336.89, 11329.88]))
+        self.assertTrue(np.array_equal(parsed['close'], [11329.88, 11381.36]))
+        self.assertTrue(np.array_equal(parsed['volume'], [4543.82, 1907.43]))
+        self.assertEqual(self.kraken.get_older_entry_ts(parsed), 1561485600)
+        self.assertEqual(self.kraken.get_most_recent_entry_ts(parsed), 1561489200)
+
+    def test_parse_response_keeps_commited_frames(self):
+        self.response['result']['last'] = 1561492800
+        parsed = self.kraken.parse_response_to_list(self.response, self.kraken.config.btc)
+
+        self.assertEqual(len(parsed['high']), 3)
+        self.assertEqual(self.kraken.get_most_recent_entry_ts(parsed), 1561492800)
+
+    def test_persist_parsed_columns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            persistor = KrakenPersistor(base_path=tmp_dir)
+            parsed = self.kraken.parse_response_to_list(self.response, self.kraken.config.btc)
+            persistor.persist(parsed)
+
+            self.assertEqual(persistor.get_most_recent_timestamp(), 1561489200)
+
+            stored = pd.read_csv(persistor._get_csv_path())
+            self.assertEqual(list(stored.columns[1:]), list(persistor._get_columns_names()))
+            self.assertTrue(np.array_equal(stored['timestamp'], [1561485600, 1561489200]))
+            self.assertTrue(np.array_equal(stored['close'], [11329.88, 11381.36]))
+
+            # the entries already stored are not persisted again
+            self.response['result']['last'] = 1561492800
+            persistor.persist(self.kraken.parse_response_to_list(self.response, self.kraken.config.btc))
+            stored = pd.read_csv(persistor._get_csv_path())
+            self.assertTrue(np.array_equal(stored['timestamp'], [1561485600, 1561489200, 1561492800]))
+
+
 class KrakenAlertDummy:
     def __init__(self):
         self.error_call_count = 0